@@ -5,12 +5,22 @@ Omarchy MCP Server - Knowledge base for Omarchy/Arch/Hyprland
 
 import os
 import sys
-import json
+import time
+import asyncio
 import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from typing import Optional
 import chromadb
+import numpy as np
+import onnxruntime
+import orjson
+import torch
+import torch.nn.functional as F
 from mcp.server.fastmcp import FastMCP
 from sentence_transformers import SentenceTransformer
+from transformers import AutoTokenizer
 
 # Configure logging to use stderr (not stdout, which is used by MCP protocol)
 logging.basicConfig(
@@ -23,28 +33,225 @@ logger = logging.getLogger(__name__)
 # Configuration
 CHROMA_HOST = os.getenv("CHROMA_HOST", "chromadb")
 CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+# Chroma persist directory. When set, the collection is opened in-process
+# with PersistentClient instead of over HTTP from the chromadb service.
+CHROMA_LOCAL_PATH = os.getenv("CHROMA_LOCAL_PATH")
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2's sentence-transformers truncation length
+# "auto" runs bfloat16 on GPUs and float32 on CPU. Set to "bfloat16" on
+# CPUs with native BF16 support (AVX512-BF16/AMX) to halve weight bandwidth.
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "auto")
+# Directory written by scripts/export_onnx_model.py. When set, queries are
+# embedded with the INT8 ONNX model instead of PyTorch.
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR")
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", os.cpu_count() or 1))
+SOURCES = ("omarchy", "omarchy_releases", "hyprland", "arch")
+SOURCE_COUNTS_TTL = 60  # seconds
+
+# Inference only: use every core for intra-op work and never build autograd graphs
+torch.set_num_threads(TORCH_THREADS)
+torch.set_num_interop_threads(1)
+torch.set_grad_enabled(False)
+
+@asynccontextmanager
+async def server_lifespan(server):
+    """Connect to Chroma and warm its index before the first tool call."""
+    await get_collection()
+    yield
+
 
 # Initialize MCP Server
-mcp = FastMCP("omarchy-kb")
+mcp = FastMCP("omarchy-kb", lifespan=server_lifespan)
 
 # Initialize embedding model
-logger.info(f"🔧 Loading embedding model: {EMBEDDING_MODEL}")
-embedder = SentenceTransformer(EMBEDDING_MODEL)
+if ONNX_MODEL_DIR:
+    logger.info(f"🔧 Loading ONNX embedding model: {ONNX_MODEL_DIR}")
+    ort_session = onnxruntime.InferenceSession(
+        os.path.join(ONNX_MODEL_DIR, "model_int8.onnx"),
+        providers=["CPUExecutionProvider"]
+    )
+    ort_input_names = {i.name for i in ort_session.get_inputs()}
+    tokenizer = AutoTokenizer.from_pretrained(ONNX_MODEL_DIR)
+else:
+    if EMBEDDING_DTYPE == "auto":
+        EMBEDDING_DTYPE = "bfloat16" if torch.cuda.is_available() else "float32"
+    logger.info(f"🔧 Loading embedding model: {EMBEDDING_MODEL} ({EMBEDDING_DTYPE})")
+    embedder = SentenceTransformer(
+        EMBEDDING_MODEL,
+        model_kwargs={"torch_dtype": getattr(torch, EMBEDDING_DTYPE)}
+    )
+    # Call the tokenizer and transformer directly; encode() adds several
+    # Python-level hops that dominate the cost of embedding a short query.
+    tokenizer = embedder.tokenizer
+    model = embedder[0].auto_model
+    model.eval()
+
+class LocalCollection:
+    """Awaitable wrapper around a PersistentClient collection.
+
+    Runs the blocking in-process calls on a worker thread so tools can
+    await them exactly like AsyncHttpClient collection methods.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    async def query(self, **kwargs):
+        return await asyncio.to_thread(self._collection.query, **kwargs)
 
-# Connect to Chroma
-logger.info(f"🔌 Connecting to Chroma at {CHROMA_HOST}:{CHROMA_PORT}")
-client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-collection = client.get_collection(name="omarchy_docs")
+    async def get(self, **kwargs):
+        return await asyncio.to_thread(self._collection.get, **kwargs)
+
+    async def count(self):
+        return await asyncio.to_thread(self._collection.count)
+
+
+# Connect to Chroma lazily: the async client has to be created inside the
+# event loop that mcp.run() starts.
+client = None
+collection = None
+_collection_lock = asyncio.Lock()
+
+
+async def get_collection():
+    """Return the docs collection, connecting to Chroma on first use."""
+    global client, collection
+
+    async with _collection_lock:
+        if collection is None:
+            if CHROMA_LOCAL_PATH:
+                logger.info(f"📂 Opening local Chroma at {CHROMA_LOCAL_PATH}")
+                client = chromadb.PersistentClient(path=CHROMA_LOCAL_PATH)
+                collection = LocalCollection(client.get_collection(name="omarchy_docs"))
+            else:
+                logger.info(f"🔌 Connecting to Chroma at {CHROMA_HOST}:{CHROMA_PORT}")
+                client = await chromadb.AsyncHttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+                collection = await client.get_collection(name="omarchy_docs")
+            logger.info(f"✅ Connected to collection with {await collection.count()} documents")
+            # Load the HNSW index now rather than on the first real query
+            await collection.query(
+                query_embeddings=_warmup_embedding,
+                n_results=1,
+                include=["distances"]
+            )
+
+    return collection
+
+
+# ============================================================================
+# QUERY EMBEDDING
+# ============================================================================
+
+QUERY_CACHE_SIZE = 4096
+# How long the encoder waits for more queries to join a batch
+ENCODE_BATCH_WINDOW = float(os.getenv("ENCODE_BATCH_WINDOW_MS", "3")) / 1000
+
+# text -> embedding, least recently used first. The process only ever loads
+# EMBEDDING_MODEL, so the text alone is a sufficient cache key.
+_query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_encode_queue: Optional[asyncio.Queue] = None
+_encode_worker_task: Optional[asyncio.Task] = None
+
+
+def _cache_store(text: str, embedding: np.ndarray) -> None:
+    _query_cache[text] = embedding
+    _query_cache.move_to_end(text)
+    if len(_query_cache) > QUERY_CACHE_SIZE:
+        _query_cache.popitem(last=False)
+
+
+def _embed_batch(texts: list[str]) -> np.ndarray:
+    """Embed texts in one forward pass with whichever backend is loaded.
+
+    Both backends reproduce the sentence-transformers pipeline: mean-pool
+    the token embeddings over the attention mask, then L2-normalize.
+    """
+    if ONNX_MODEL_DIR:
+        encoded = tokenizer(texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np")
+        hidden = ort_session.run(None, {k: v for k, v in encoded.items() if k in ort_input_names})[0]
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.linalg.norm(pooled, axis=1, keepdims=True)
+
+    with torch.inference_mode():
+        encoded = tokenizer(texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="pt")
+        encoded = encoded.to(model.device)
+        # Pool in fp32 even when the model runs in bfloat16
+        hidden = model(**encoded).last_hidden_state.float()
+        mask = encoded["attention_mask"].unsqueeze(-1).float()
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        return F.normalize(pooled, p=2, dim=1).cpu().numpy()
+
+
+async def _encode_worker():
+    """Drain pending queries and embed each batch in a single forward pass."""
+    while True:
+        batch = [await _encode_queue.get()]
+        await asyncio.sleep(ENCODE_BATCH_WINDOW)
+        while not _encode_queue.empty():
+            batch.append(_encode_queue.get_nowait())
+
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = await asyncio.to_thread(_embed_batch, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+
+        # Rows are shared with the cache, so freeze them
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        vectors.flags.writeable = False
+        embeddings = {}
+        for text, vector in zip(texts, vectors):
+            embeddings[text] = vector
+            _cache_store(text, vector)
+        for text, future in batch:
+            if not future.done():
+                future.set_result(embeddings[text])
+
+
+# Run one throwaway batch so the first real query doesn't pay for lazy
+# initialization (thread pools, kernel selection, ONNX graph setup).
+logger.info("🔥 Warming up embedding model")
+_warmup_embedding = _embed_batch(["warmup"])
+
+
+async def enqueue_encode(text: str) -> np.ndarray:
+    """Embed a query, coalescing concurrent tool calls into one encode."""
+    global _encode_queue, _encode_worker_task
+
+    cached = _query_cache.get(text)
+    if cached is not None:
+        _query_cache.move_to_end(text)
+        return cached
+
+    if _encode_worker_task is None or _encode_worker_task.done():
+        _encode_queue = asyncio.Queue()
+        _encode_worker_task = asyncio.create_task(_encode_worker())
+
+    future = asyncio.get_running_loop().create_future()
+    _encode_queue.put_nowait((text, future))
+    return await future
 
-logger.info(f"✅ Connected to collection with {collection.count()} documents")
 
 # ============================================================================
 # TOOL 1: Search Documentation
 # ============================================================================
 
+# Interned source names, so every hit shares one string per source
+SOURCE_NAMES = {source: sys.intern(source) for source in (*SOURCES, "unknown")}
+
+
+@lru_cache(maxsize=1024)
+def _split_tags(tags: str) -> tuple[str, ...]:
+    """Split a comma-joined tags string. Few distinct values, so memoized."""
+    return tuple(tags.split(",")) if tags else ()
+
+
 @mcp.tool()
-def search_documentation(
+async def search_documentation(
     query: str,
     source_filter: Optional[str] = None,
     omarchy_version: Optional[str] = None,
@@ -69,7 +276,8 @@ def search_documentation(
     """
     
     # Generate query embedding
-    query_embedding = embedder.encode(query).tolist()
+    query_embedding = await enqueue_encode(query)
+    collection = await get_collection()
     
     # Build filter
     where_filter = {}
@@ -84,8 +292,8 @@ def search_documentation(
         where_filter["version"] = omarchy_version
     
     # Query Chroma
-    results = collection.query(
-        query_embeddings=[query_embedding],
+    results = await collection.query(
+        query_embeddings=query_embedding.reshape(1, -1),
         n_results=min(top_k, 20),
         where=where_filter if where_filter else None,
         include=["documents", "metadatas", "distances"]
@@ -99,61 +307,99 @@ def search_documentation(
             results["metadatas"][0],
             results["distances"][0]
         ):
+            source = meta.get("source", "unknown")
             formatted_results.append({
-                "source": meta.get("source", "unknown"),
+                "source": SOURCE_NAMES.get(source, source),
                 "page": meta.get("page", ""),
                 "section": meta.get("section", ""),
                 "content": doc,
                 "confidence": round(1 - distance, 3),
                 "priority": meta.get("priority", 3),
                 "version": meta.get("version", "any"),
-                "tags": meta.get("tags", "").split(",") if meta.get("tags") else []
+                "tags": _split_tags(meta.get("tags", ""))
             })
     
-    # Sort by priority first (Omarchy > Hyprland > Arch), then by confidence
-    formatted_results.sort(key=lambda x: (x["priority"], -x["confidence"]))
+    # Sort by priority (Omarchy > Hyprland > Arch). The sort is stable, so
+    # Chroma's distance ordering is kept within each priority.
+    formatted_results.sort(key=lambda x: x["priority"])
     
-    return json.dumps(formatted_results, indent=2)
+    return orjson.dumps(formatted_results, option=orjson.OPT_INDENT_2).decode()
 
 
 # ============================================================================
 # TOOL 2: Find Config File Locations
 # ============================================================================
 
+async def _excerpts(collection, ids: list[str], metadatas: list[dict], key: str, length: int) -> list[str]:
+    """Return each hit's pre-truncated excerpt from its metadata.
+
+    Chunks ingested before the excerpt fields existed don't have them; their
+    documents are fetched by id in one extra call and truncated here instead.
+    """
+    missing = [doc_id for doc_id, meta in zip(ids, metadatas) if key not in meta]
+    documents = {}
+    if missing:
+        stored = await collection.get(ids=missing, include=["documents"])
+        documents = dict(zip(stored["ids"], stored["documents"]))
+    return [
+        meta[key] if key in meta else (documents.get(doc_id) or "")[:length]
+        for doc_id, meta in zip(ids, metadatas)
+    ]
+
+
 @mcp.tool()
-def find_config_location(app_name: str, source: str = "omarchy") -> str:
+async def find_config_location(app_name: str, source: str = "omarchy") -> str:
     """Find exact file paths for configuration files."""
     
     # Search for config location info
     search_query = f"{app_name} configuration file path location"
-    query_embedding = embedder.encode(search_query).tolist()
+    query_embedding = await enqueue_encode(search_query)
+    collection = await get_collection()
     
-    results = collection.query(
-        query_embeddings=[query_embedding],
+    # Only sections that mention a config path, flagged at ingest time
+    results = await collection.query(
+        query_embeddings=query_embedding.reshape(1, -1),
         n_results=5,
-        where={"source": source},
-        include=["documents", "metadatas"]
+        where={"$and": [{"source": source}, {"has_config_path": True}]},
+        include=["metadatas"]
     )
     
+    hits = []  # (metadata, excerpt)
+    if results["metadatas"] and results["metadatas"][0]:
+        metadatas = results["metadatas"][0]
+        excerpts = await _excerpts(collection, results["ids"][0], metadatas, "excerpt_500", 500)
+        hits = list(zip(metadatas, excerpts))
+    else:
+        # Collections ingested before has_config_path existed match nothing
+        # above, so scan the documents for path markers instead
+        results = await collection.query(
+            query_embeddings=query_embedding.reshape(1, -1),
+            n_results=5,
+            where={"source": source},
+            include=["documents", "metadatas"]
+        )
+        if results["documents"]:
+            for doc, meta in zip(results["documents"][0], results["metadatas"][0]):
+                if "~/" in doc or "/etc/" in doc or ".config" in doc:
+                    hits.append((meta, doc[:500]))
+    
     # Extract location info
     locations = []
-    if results["documents"]:
-        for doc, meta in zip(results["documents"][0], results["metadatas"][0]):
-            if "~/" in doc or "/etc/" in doc or ".config" in doc:
-                locations.append({
-                    "app": app_name,
-                    "source": source,
-                    "page": meta.get("page", ""),
-                    "excerpt": doc[:500],
-                    "priority": meta.get("priority", 3)
-                })
+    for meta, excerpt in hits:
+        locations.append({
+            "app": app_name,
+            "source": source,
+            "page": meta.get("page", ""),
+            "excerpt": excerpt,
+            "priority": meta.get("priority", 3)
+        })
     
     if not locations:
-        return json.dumps({
+        return orjson.dumps({
             "error": f"No config location found for {app_name} in {source}"
-        })
+        }).decode()
     
-    return json.dumps(locations, indent=2)
+    return orjson.dumps(locations, option=orjson.OPT_INDENT_2).decode()
 
 
 # ============================================================================
@@ -161,25 +407,18 @@ def find_config_location(app_name: str, source: str = "omarchy") -> str:
 # ============================================================================
 
 @mcp.tool()
-def compare_omarchy_vs_arch(topic: str) -> str:
+async def compare_omarchy_vs_arch(topic: str) -> str:
     """Compare how Omarchy differs from vanilla Arch/Hyprland."""
     
-    query_embedding = embedder.encode(topic).tolist()
+    query_embedding = await enqueue_encode(topic)
+    collection = await get_collection()
     
-    # Get Omarchy docs (smart filter here too)
-    omarchy_results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=3,
-        where={"source": {"$in": ["omarchy", "omarchy_releases"]}},
-        include=["documents", "metadatas"]
-    )
-    
-    # Get Arch/Hyprland docs
-    arch_results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=3,
-        where={"source": {"$in": ["arch", "hyprland"]}},
-        include=["documents", "metadatas"]
+    # One query across all sources, split by source afterwards
+    results = await collection.query(
+        query_embeddings=query_embedding.reshape(1, -1),
+        n_results=6,
+        where={"source": {"$in": ["omarchy", "omarchy_releases", "arch", "hyprland"]}},
+        include=["metadatas"]
     )
     
     comparison = {
@@ -188,54 +427,74 @@ def compare_omarchy_vs_arch(topic: str) -> str:
         "arch_hyprland_approach": []
     }
     
-    if omarchy_results["documents"]:
-        for doc, meta in zip(omarchy_results["documents"][0], omarchy_results["metadatas"][0]):
-            comparison["omarchy_approach"].append({
-                "page": meta.get("page", ""),
-                "excerpt": doc[:300]
-            })
-    
-    if arch_results["documents"]:
-        for doc, meta in zip(arch_results["documents"][0], arch_results["metadatas"][0]):
-            comparison["arch_hyprland_approach"].append({
-                "source": meta.get("source", ""),
-                "page": meta.get("page", ""),
-                "excerpt": doc[:300]
-            })
+    if results["metadatas"]:
+        metadatas = results["metadatas"][0]
+        excerpts = await _excerpts(collection, results["ids"][0], metadatas, "excerpt_300", 300)
+        for meta, excerpt in zip(metadatas, excerpts):
+            source = meta.get("source", "")
+            if source in ("omarchy", "omarchy_releases"):
+                comparison["omarchy_approach"].append({
+                    "page": meta.get("page", ""),
+                    "excerpt": excerpt
+                })
+            else:
+                comparison["arch_hyprland_approach"].append({
+                    "source": source,
+                    "page": meta.get("page", ""),
+                    "excerpt": excerpt
+                })
     
-    return json.dumps(comparison, indent=2)
+    return orjson.dumps(comparison, option=orjson.OPT_INDENT_2).decode()
 
 
 # ============================================================================
 # SERVER INFO
 # ============================================================================
 
+# Per-source document counts, refreshed at most every SOURCE_COUNTS_TTL
+_source_counts: dict[str, int] = {}
+_source_counts_at = 0.0
+
+
+async def _get_source_counts() -> dict[str, int]:
+    """Return cached document counts per source plus the collection total."""
+    global _source_counts_at
+
+    if not _source_counts or time.monotonic() - _source_counts_at > SOURCE_COUNTS_TTL:
+        collection = await get_collection()
+        # include=[] returns ids only, no documents/embeddings/metadata
+        total, *per_source = await asyncio.gather(
+            collection.count(),
+            *(collection.get(where={"source": source}, include=[]) for source in SOURCES)
+        )
+        _source_counts["total"] = total
+        for source, result in zip(SOURCES, per_source):
+            _source_counts[source] = len(result["ids"])
+        _source_counts_at = time.monotonic()
+
+    return _source_counts
+
+
 @mcp.tool()
-def get_server_info() -> str:
+async def get_server_info() -> str:
     """Get information about the Omarchy MCP knowledge base."""
     
-    total_docs = collection.count()
-    
-    # Count by source
-    omarchy_count = len(collection.get(where={"source": "omarchy"})["ids"])
-    releases_count = len(collection.get(where={"source": "omarchy_releases"})["ids"])
-    hyprland_count = len(collection.get(where={"source": "hyprland"})["ids"])
-    arch_count = len(collection.get(where={"source": "arch"})["ids"])
+    counts = await _get_source_counts()
     
     info = {
         "name": "Omarchy Knowledge Base MCP Server",
         "version": "1.0.0",
-        "total_documents": total_docs,
+        "total_documents": counts["total"],
         "sources": {
-            "omarchy": {"count": omarchy_count, "priority": 1, "description": "Omarchy docs"},
-            "omarchy_releases": {"count": releases_count, "priority": 1, "description": "Release notes"},
-            "hyprland": {"count": hyprland_count, "priority": 2, "description": "Hyprland wiki"},
-            "arch": {"count": arch_count, "priority": 3, "description": "Arch Linux wiki"}
+            "omarchy": {"count": counts["omarchy"], "priority": 1, "description": "Omarchy docs"},
+            "omarchy_releases": {"count": counts["omarchy_releases"], "priority": 1, "description": "Release notes"},
+            "hyprland": {"count": counts["hyprland"], "priority": 2, "description": "Hyprland wiki"},
+            "arch": {"count": counts["arch"], "priority": 3, "description": "Arch Linux wiki"}
         },
         "embedding_model": EMBEDDING_MODEL
     }
     
-    return json.dumps(info, indent=2)
+    return orjson.dumps(info, option=orjson.OPT_INDENT_2).decode()
 
 
 if __name__ == "__main__":
@@ -5,30 +5,32 @@ Only processes English pages, extracts sections, adds metadata.
 """
 
 import os
-import json
+import orjson
+import multiprocessing
 from pathlib import Path
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 import re
 
 RAW_DIR = Path("data/raw/archwiki/html/en")
 OUTPUT_DIR = Path("data/processed/archwiki")
+OUTPUT_FILE = OUTPUT_DIR / "archwiki.jsonl"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 def clean_html_to_markdown(html_file):
     """Extract clean text from ArchWiki HTML page."""
     with open(html_file, 'r', encoding='utf-8') as f:
-        soup = BeautifulSoup(f.read(), 'lxml')
+        tree = LexborHTMLParser(f.read())
     
     # Remove navigation, footer, sidebar
-    for unwanted in soup.select('.mw-navigation, .mw-footer, #toc, .printfooter'):
+    for unwanted in tree.css('.mw-navigation, .mw-footer, #toc, .printfooter'):
         unwanted.decompose()
     
     # Get page title
-    title_tag = soup.select_one('h1.firstHeading')
-    title = title_tag.get_text().strip() if title_tag else html_file.stem
+    title_tag = tree.css_first('h1.firstHeading')
+    title = title_tag.text().strip() if title_tag else html_file.stem
     
     # Get main content
-    content = soup.select_one('#mw-content-text')
+    content = tree.css_first('#mw-content-text')
     if not content:
         return None
     
@@ -36,17 +38,18 @@ def clean_html_to_markdown(html_file):
     sections = []
     current_section = {"title": "Introduction", "content": []}
     
-    for element in content.children:
-        if element.name == 'h2':
+    # iter() yields element children only, text nodes are skipped
+    for element in content.iter():
+        if element.tag == 'h2':
             # Save previous section
             if current_section["content"]:
                 sections.append(current_section)
             # Start new section
-            headline = element.select_one('.mw-headline')
-            section_title = headline.get_text().strip() if headline else element.get_text().strip()
+            headline = element.css_first('.mw-headline')
+            section_title = headline.text().strip() if headline else element.text().strip()
             current_section = {"title": section_title, "content": []}
-        elif element.name in ['p', 'ul', 'ol', 'pre', 'div']:
-            text = element.get_text().strip()
+        elif element.tag in ['p', 'ul', 'ol', 'pre', 'div']:
+            text = element.text().strip()
             if text:
                 current_section["content"].append(text)
     
@@ -59,49 +62,70 @@ def clean_html_to_markdown(html_file):
         "sections": sections
     }
 
+def process_page(html_file):
+    """Clean one page and attach metadata. Runs in a worker process."""
+    try:
+        result = clean_html_to_markdown(html_file)
+    except Exception as e:
+        print(f"  ⚠️  Error processing {html_file.name}: {e}")
+        return None
+    if not result:
+        return None
+    
+    page_name = result["page"].replace("/", "_").replace(" ", "_")
+    
+    # Add metadata
+    output_data = {
+        "source": "arch",
+        "page": result["page"],
+        "version": "any",
+        "sections": []
+    }
+    
+    # Each section becomes a separate document chunk
+    for section in result["sections"]:
+        output_data["sections"].append({
+            "section": section["title"],
+            "content": "\n\n".join(section["content"]),
+            "priority": 3,  # Arch = priority 3 (lowest)
+            "tags": ["arch", result["page"].lower().replace(" ", "-")]
+        })
+    
+    return page_name, output_data
+
 def main():
     print("🧹 Cleaning ArchWiki HTML files...")
     processed_count = 0
     
-    # Process all HTML files in en/ directory
-    for html_file in RAW_DIR.rglob("*.html"):
-        try:
-            result = clean_html_to_markdown(html_file)
+    # Per-page JSON files from older runs would be ingested twice
+    for stale_file in OUTPUT_DIR.glob("*.json"):
+        stale_file.unlink()
+    
+    # Same-named pages used to overwrite each other's JSON file. Keep one so
+    # the chunk ids derived from the page name stay unique.
+    seen_pages = set()
+    
+    # Process all HTML files in en/ directory. Parsing is CPU-bound, so it
+    # runs across all cores; only the main process writes output.
+    html_files = list(RAW_DIR.rglob("*.html"))
+    
+    # One page per line, so ingestion streams a single file
+    with open(OUTPUT_FILE, 'wb') as out, multiprocessing.Pool() as pool:
+        for result in pool.imap(process_page, html_files, chunksize=16):
             if not result:
                 continue
+            page_name, output_data = result
+            if page_name in seen_pages:
+                continue
+            seen_pages.add(page_name)
             
-            # Save as JSON with metadata
-            page_name = result["page"].replace("/", "_").replace(" ", "_")
-            output_file = OUTPUT_DIR / f"{page_name}.json"
-            
-            # Add metadata
-            output_data = {
-                "source": "arch",
-                "page": result["page"],
-                "version": "any",
-                "sections": []
-            }
-            
-            # Each section becomes a separate document chunk
-            for section in result["sections"]:
-                output_data["sections"].append({
-                    "section": section["title"],
-                    "content": "\n\n".join(section["content"]),
-                    "priority": 3,  # Arch = priority 3 (lowest)
-                    "tags": ["arch", result["page"].lower().replace(" ", "-")]
-                })
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, indent=2, ensure_ascii=False)
+            out.write(orjson.dumps(output_data) + b"\n")
             
             processed_count += 1
             if processed_count % 10 == 0:
                 print(f"  Processed {processed_count} pages...")
-        
-        except Exception as e:
-            print(f"  ⚠️  Error processing {html_file.name}: {e}")
     
-    print(f"✅ Cleaned {processed_count} ArchWiki pages → {OUTPUT_DIR}")
+    print(f"✅ Cleaned {processed_count} ArchWiki pages → {OUTPUT_FILE}")
 
 if __name__ == "__main__":
     main()
@@ -5,13 +5,18 @@ Already in good format, just add metadata.
 """
 
 import os
-import json
+import re
+import orjson
 from pathlib import Path
 
 RAW_DIR = Path("data/raw/hyprland/hyprland-wiki/content")
 OUTPUT_DIR = Path("data/processed/hyprland")
+OUTPUT_FILE = OUTPUT_DIR / "hyprland.jsonl"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# A "## " header line; split() on it yields [preamble, title1, body1, ...]
+SECTION_RE = re.compile(r"^## (.*)$", re.MULTILINE)
+
 def clean_markdown_file(md_file):
     """Extract sections from Hyprland markdown."""
     with open(md_file, 'r', encoding='utf-8') as f:
@@ -21,25 +26,15 @@ def clean_markdown_file(md_file):
     category = md_file.parent.name if md_file.parent.name != "content" else "General"
     page_title = md_file.stem.replace("-", " ").title()
     
-    # Split by ## headers (sections)
-    sections = []
-    current_section = {"title": "Overview", "content": []}
-    
-    for line in content.split('\n'):
-        if line.startswith('## '):
-            # Save previous section
-            if current_section["content"]:
-                sections.append(current_section)
-            # New section
-            section_title = line.replace('##', '').strip()
-            current_section = {"title": section_title, "content": []}
-        else:
-            if line.strip():
-                current_section["content"].append(line)
+    # Split by ## headers (sections) in a single regex pass
+    parts = SECTION_RE.split(content)
+    titles = ["Overview"] + [title.replace('##', '').strip() for title in parts[1::2]]
     
-    # Add last section
-    if current_section["content"]:
-        sections.append(current_section)
+    sections = []
+    for title, body in zip(titles, parts[0::2]):
+        lines = [line for line in body.split('\n') if line.strip()]
+        if lines:
+            sections.append({"title": title, "content": lines})
     
     return {
         "page": page_title,
@@ -51,39 +46,48 @@ def main():
     print("🧹 Cleaning Hyprland markdown files...")
     processed_count = 0
     
-    for md_file in RAW_DIR.rglob("*.md"):
-        try:
-            result = clean_markdown_file(md_file)
-            
-            # Save as JSON with metadata
-            page_name = result["page"].replace("/", "_").replace(" ", "_")
-            output_file = OUTPUT_DIR / f"{page_name}.json"
-            
-            output_data = {
-                "source": "hyprland",
-                "page": result["page"],
-                "category": result["category"],
-                "version": "any",
-                "sections": []
-            }
-            
-            for section in result["sections"]:
-                output_data["sections"].append({
-                    "section": section["title"],
-                    "content": "\n".join(section["content"]),
-                    "priority": 2,  # Hyprland = priority 2
-                    "tags": ["hyprland", result["category"].lower()]
-                })
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, indent=2, ensure_ascii=False)
+    # Per-page JSON files from older runs would be ingested twice
+    for stale_file in OUTPUT_DIR.glob("*.json"):
+        stale_file.unlink()
+    
+    # Same-named pages used to overwrite each other's JSON file. Keep one so
+    # the chunk ids derived from the page name stay unique.
+    seen_pages = set()
+    
+    # One page per line, so ingestion streams a single file
+    with open(OUTPUT_FILE, 'wb') as out:
+        for md_file in RAW_DIR.rglob("*.md"):
+            try:
+                result = clean_markdown_file(md_file)
+                page_name = result["page"].replace("/", "_").replace(" ", "_")
+                if page_name in seen_pages:
+                    continue
+                seen_pages.add(page_name)
+                
+                output_data = {
+                    "source": "hyprland",
+                    "page": result["page"],
+                    "category": result["category"],
+                    "version": "any",
+                    "sections": []
+                }
+                
+                for section in result["sections"]:
+                    output_data["sections"].append({
+                        "section": section["title"],
+                        "content": "\n".join(section["content"]),
+                        "priority": 2,  # Hyprland = priority 2
+                        "tags": ["hyprland", result["category"].lower()]
+                    })
+                
+                out.write(orjson.dumps(output_data) + b"\n")
+                
+                processed_count += 1
             
-            processed_count += 1
-        
-        except Exception as e:
-            print(f"  ⚠️  Error processing {md_file.name}: {e}")
+            except Exception as e:
+                print(f"  ⚠️  Error processing {md_file.name}: {e}")
     
-    print(f"✅ Cleaned {processed_count} Hyprland pages → {OUTPUT_DIR}")
+    print(f"✅ Cleaned {processed_count} Hyprland pages → {OUTPUT_FILE}")
 
 if __name__ == "__main__":
     main()
@@ -5,9 +5,10 @@ Highest priority source.
 """
 
 import os
-import json
+import orjson
+import multiprocessing
 from pathlib import Path
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 
 MANUAL_DIR = Path("data/raw/omarchy/learn.omacom.io/2/the-omarchy-manual")
 RELEASES_FILE = Path("data/raw/omarchy/releases.html")
@@ -18,21 +19,21 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 def clean_manual_page(html_file):
     """Extract content from Omarchy manual page."""
     with open(html_file, 'r', encoding='utf-8') as f:
-        soup = BeautifulSoup(f.read(), 'lxml')
+        tree = LexborHTMLParser(f.read())
     
     # Get title
-    title_tag = soup.select_one('h1') or soup.select_one('title')
-    title = title_tag.get_text().strip() if title_tag else html_file.stem
+    title_tag = tree.css_first('h1') or tree.css_first('title')
+    title = title_tag.text().strip() if title_tag else html_file.stem
     
     # Get main content
-    content_div = soup.select_one('article') or soup.select_one('main') or soup.select_one('body')
+    content_div = tree.css_first('article') or tree.css_first('main') or tree.css_first('body')
     if not content_div:
         return None
     
-    # Extract paragraphs
+    # Extract paragraphs (css() returns matches in document order)
     paragraphs = []
-    for p in content_div.find_all(['p', 'li', 'code', 'pre']):
-        text = p.get_text().strip()
+    for p in content_div.css('p, li, code, pre'):
+        text = p.text().strip()
         if text and len(text) > 20:  # Filter out tiny fragments
             paragraphs.append(text)
     
@@ -44,15 +45,15 @@ def clean_manual_page(html_file):
 def parse_releases():
     """Extract release notes from GitHub releases page."""
     with open(RELEASES_FILE, 'r', encoding='utf-8') as f:
-        soup = BeautifulSoup(f.read(), 'lxml')
+        tree = LexborHTMLParser(f.read())
     
     releases = []
-    for release_div in soup.select('[data-test-selector="release-card"]'):
-        version_tag = release_div.select_one('h2 a')
-        version = version_tag.get_text().strip() if version_tag else "Unknown"
+    for release_div in tree.css('[data-test-selector="release-card"]'):
+        version_tag = release_div.css_first('h2 a')
+        version = version_tag.text().strip() if version_tag else "Unknown"
         
-        body = release_div.select_one('.markdown-body')
-        content = body.get_text().strip() if body else ""
+        body = release_div.css_first('.markdown-body')
+        content = body.text().strip() if body else ""
         
         if version and content:
             releases.append({
@@ -62,36 +63,46 @@ def parse_releases():
     
     return releases
 
+def process_manual_page(html_file):
+    """Clean one manual page and attach metadata. Runs in a worker process."""
+    try:
+        result = clean_manual_page(html_file)
+    except Exception as e:
+        print(f"  ⚠️  Error processing {html_file.name}: {e}")
+        return None
+    if not result:
+        return None
+    
+    page_name = html_file.stem
+    
+    output_data = {
+        "source": "omarchy",
+        "section": "manual",
+        "page": result["title"],
+        "version": "3.8.0",  # Update this to current version
+        "priority": 1,  # Omarchy = highest priority
+        "tags": ["omarchy", "manual"],
+        "content": result["content"]
+    }
+    
+    return page_name, output_data
+
 def main():
     print("🧹 Cleaning Omarchy documentation...")
     
-    # 1. Process manual pages
+    # 1. Process manual pages (parsed across all cores, written here)
     manual_count = 0
-    for html_file in MANUAL_DIR.rglob("*.html"):
-        try:
-            result = clean_manual_page(html_file)
+    html_files = list(MANUAL_DIR.rglob("*.html"))
+    with multiprocessing.Pool() as pool:
+        for result in pool.imap_unordered(process_manual_page, html_files, chunksize=16):
             if not result:
                 continue
-            
-            page_name = html_file.stem
+            page_name, output_data = result
             output_file = OUTPUT_DIR / f"manual_{page_name}.json"
             
-            output_data = {
-                "source": "omarchy",
-                "section": "manual",
-                "page": result["title"],
-                "version": "3.8.0",  # Update this to current version
-                "priority": 1,  # Omarchy = highest priority
-                "tags": ["omarchy", "manual"],
-                "content": result["content"]
-            }
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, indent=2, ensure_ascii=False)
+            output_file.write_bytes(orjson.dumps(output_data, option=orjson.OPT_INDENT_2))
             
             manual_count += 1
-        except Exception as e:
-            print(f"  ⚠️  Error processing {html_file.name}: {e}")
     
     print(f"  ✅ Processed {manual_count} manual pages")
     
@@ -110,8 +121,7 @@ def main():
                 "content": release["content"]
             }
             
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, indent=2, ensure_ascii=False)
+            output_file.write_bytes(orjson.dumps(output_data, option=orjson.OPT_INDENT_2))
         
         print(f"  ✅ Processed {len(releases)} release notes")
     except Exception as e:
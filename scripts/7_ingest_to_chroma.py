@@ -4,41 +4,247 @@ Ingest processed documentation into Chroma vector database.
 OPTIMIZED: Uses batch processing for 10x faster ingestion.
 """
 
+import hashlib
+import itertools
 import os
-import json
+import re
+import sqlite3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import chromadb
-from sentence_transformers import SentenceTransformer
+import httpx
+import numpy as np
+import onnxruntime
+import orjson
+import requests
 from tqdm import tqdm
+from transformers import AutoTokenizer
 
 # Configuration
 PROCESSED_DIR = Path("data/processed")
 CHROMA_HOST = os.getenv("CHROMA_HOST", "chromadb")
 CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+# Optional Chroma persist directory. When set, chunks are written in-process
+# with PersistentClient, skipping the JSON-over-HTTP encoding of every vector.
+CHROMA_LOCAL_PATH = os.getenv("CHROMA_LOCAL_PATH")
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2's sentence-transformers truncation length
+# Directory written by scripts/export_onnx_model.py. When set, chunks are
+# embedded on CPU with the INT8 ONNX model through onnxruntime, and neither
+# PyTorch nor sentence-transformers is imported. Leave unset on GPU machines
+# to use FP16 PyTorch instead.
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR")
 CHUNK_SIZE = 400
-BATCH_SIZE = 256  # Process 256 chunks at a time (Sweet spot for CPU)
+BATCH_SIZE = 1000  # Chunks per flush / Chroma upsert (Chroma's bulk-upsert sweet spot)
+ENCODE_BATCH_SIZE = 64  # Sentences per forward pass inside one flush
+READ_WORKERS = 8  # Threads reading/parsing JSON ahead of the embedder
+READ_AHEAD = READ_WORKERS * 2  # Files parsed ahead of the embedder at most
+# Markers of a config file path, stored as the has_config_path metadata flag
+CONFIG_PATH_RE = re.compile(r"~/|/etc/|\.config")
+# Characters replaced with "_" in chunk ids, in a single translate() pass
+ID_TRANS = str.maketrans({" ": "_", "/": "_"})
+# Embeddings of previously ingested chunk texts, so re-runs and text repeated
+# across release notes skip the model
+EMBEDDING_CACHE_FILE = Path("data/embedding_cache.sqlite")
 
-# Initialize
-print(f"🔧 Initializing embedding model: {EMBEDDING_MODEL}")
-embedder = SentenceTransformer(EMBEDDING_MODEL)
+class OnnxEmbedder:
+    """encode() shim over the INT8 ONNX export of the embedding model.
 
-print(f"🔌 Connecting to Chroma at {CHROMA_HOST}:{CHROMA_PORT}")
-client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+    Reproduces the sentence-transformers pipeline: mean-pool the token
+    embeddings over the attention mask, then L2-normalize.
+    """
 
-collection = client.get_or_create_collection(
-    name="omarchy_docs",
-    metadata={"hnsw:space": "cosine"}
-)
+    def __init__(self, model_dir):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        # CPU only: requirements.txt installs the CPU onnxruntime build, and
+        # the dynamic-quantized INT8 ops mostly fall back to CPU on CUDA anyway
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model_int8.onnx"),
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, sentences, batch_size=32):
+        embeddings = []
+        for start in range(0, len(sentences), batch_size):
+            encoded = self.tokenizer(
+                sentences[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=MAX_SEQ_LENGTH,
+                return_tensors="np"
+            )
+            inputs = {k: v for k, v in encoded.items() if k in self.input_names}
+            hidden = self.session.run(None, inputs)[0]
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            embeddings.append(pooled / np.linalg.norm(pooled, axis=1, keepdims=True))
+        return np.concatenate(embeddings)
+
+class EmbeddingCache:
+    """On-disk map from (chunk text hash, embedding backend) to its float32 vector."""
+
+    # Stays under SQLite's default limit on bound parameters per statement
+    LOOKUP_BATCH_SIZE = 500
+
+    def __init__(self, path, model_key):
+        self.model_key = model_key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "hash BLOB, model TEXT, embedding BLOB, PRIMARY KEY (hash, model))"
+        )
+
+    @staticmethod
+    def key(document):
+        return hashlib.sha1(document.encode("utf-8")).digest()
+
+    def get_many(self, hashes):
+        """Return {hash: vector} for the hashes that are cached."""
+        hashes = list(set(hashes))
+        found = {}
+        for start in range(0, len(hashes), self.LOOKUP_BATCH_SIZE):
+            batch = hashes[start:start + self.LOOKUP_BATCH_SIZE]
+            rows = self.db.execute(
+                f"SELECT hash, embedding FROM embeddings WHERE model = ? "
+                f"AND hash IN ({','.join('?' * len(batch))})",
+                [self.model_key, *batch]
+            )
+            for h, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, vectors):
+        """Store {hash: vector} and commit."""
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(h, self.model_key, vector.astype(np.float32).tobytes()) for h, vector in vectors.items()]
+            )
+
+    def close(self):
+        self.db.close()
+
+# Initialized by init_pipeline(). Nothing heavy runs at import time, because
+# the CPU multi-process pool's spawned workers re-import this script.
+device = None
+embedder = None
+pool = None
+collection = None
+embedding_cache = None
 
-def chunk_text(text, chunk_size=CHUNK_SIZE):
-    """Split text into chunks."""
-    words = text.split()
+def init_pipeline():
+    """Load the embedding model (plus CPU worker pool) and connect to Chroma."""
+    global device, embedder, pool, collection, embedding_cache
+    
+    if ONNX_MODEL_DIR:
+        print(f"🔧 Initializing INT8 ONNX embedding model: {ONNX_MODEL_DIR}")
+        embedder = OnnxEmbedder(ONNX_MODEL_DIR)
+    else:
+        # Imported here so the ONNX path never loads PyTorch
+        import torch
+        from sentence_transformers import SentenceTransformer
+        
+        if torch.cuda.is_available():
+            device = "cuda"
+        elif torch.backends.mps.is_available():
+            device = "mps"
+        else:
+            device = "cpu"
+        print(f"🔧 Initializing embedding model: {EMBEDDING_MODEL} on {device}")
+        embedder = SentenceTransformer(EMBEDDING_MODEL, device=device)
+        if device == "cuda":
+            # FP16 halves weight bandwidth; cosine retrieval doesn't need fp32
+            embedder = embedder.half()
+        elif device == "cpu":
+            # One single-threaded encoder process per core sidesteps the GIL.
+            # Workers inherit OMP_NUM_THREADS so they don't oversubscribe cores.
+            workers = os.cpu_count() or 1
+            print(f"🧵 Starting {workers} CPU encoder processes")
+            os.environ["OMP_NUM_THREADS"] = "1"
+            torch.set_num_threads(1)
+            pool = embedder.start_multi_process_pool(["cpu"] * workers)
+    
+    # Vectors from the INT8 ONNX model, FP16 CUDA and FP32 CPU/MPS PyTorch
+    # differ slightly, so each backend and precision gets its own cache entries
+    if ONNX_MODEL_DIR:
+        backend = "onnx-int8"
+    else:
+        backend = f"torch-{device}-{'fp16' if device == 'cuda' else 'fp32'}"
+    embedding_cache = EmbeddingCache(EMBEDDING_CACHE_FILE, f"{EMBEDDING_MODEL}:{backend}:{MAX_SEQ_LENGTH}")
+    
+    if CHROMA_LOCAL_PATH:
+        print(f"📂 Opening local Chroma at {CHROMA_LOCAL_PATH}")
+        client = chromadb.PersistentClient(path=CHROMA_LOCAL_PATH)
+    else:
+        print(f"🔌 Connecting to Chroma at {CHROMA_HOST}:{CHROMA_PORT}")
+        client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+    
+    collection = client.get_or_create_collection(
+        name="omarchy_docs",
+        metadata={"hnsw:space": "cosine"}
+    )
+
+def embed_in_process(documents):
+    """Embed documents with the loaded model's tokenizer and transformer directly.
+
+    Skips SentenceTransformer.encode's per-call bookkeeping: each forward pass
+    is one batched call into the Rust fast tokenizer followed by the bare
+    transformer under inference_mode. Mean pooling and L2-normalization match
+    the sentence-transformers pipeline.
+    """
+    import torch
+    
+    tokenizer = embedder.tokenizer
+    model = embedder[0].auto_model
+    embeddings = []
+    with torch.inference_mode():
+        for start in range(0, len(documents), ENCODE_BATCH_SIZE):
+            encoded = tokenizer(
+                documents[start:start + ENCODE_BATCH_SIZE],
+                padding=True,
+                truncation=True,
+                max_length=MAX_SEQ_LENGTH,
+                return_tensors="pt"
+            ).to(device)
+            # Pool in fp32 even when the model runs in FP16
+            hidden = model(**encoded).last_hidden_state.float()
+            mask = encoded["attention_mask"].unsqueeze(-1).float()
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            embeddings.append(torch.nn.functional.normalize(pooled, p=2, dim=1).cpu().numpy())
+    return np.concatenate(embeddings)
+
+def encode_documents(documents):
+    """Embed documents with the loaded backend; float32 rows in input order."""
+    # Encode in length order so each forward pass pads to similar lengths,
+    # then scatter the rows back into input order.
+    order = np.argsort([len(doc) for doc in documents], kind="stable")
+    sorted_documents = [documents[i] for i in order]
+    if pool is not None:
+        sorted_embeddings = embedder.encode_multi_process(
+            sorted_documents,
+            pool,
+            batch_size=ENCODE_BATCH_SIZE,
+            normalize_embeddings=True
+        )
+    elif isinstance(embedder, OnnxEmbedder):
+        sorted_embeddings = embedder.encode(sorted_documents, batch_size=ENCODE_BATCH_SIZE)
+    else:
+        sorted_embeddings = embed_in_process(sorted_documents)
+    # float32 whatever the model ran in (FP16 on CUDA); Chroma stores float32
+    embeddings = np.empty(sorted_embeddings.shape, dtype=np.float32)
+    embeddings[order] = sorted_embeddings
+    return embeddings
+
+def chunk_words(words, chunk_size=CHUNK_SIZE):
+    """Join an already-split word list into chunks of chunk_size words."""
     chunks = []
     for i in range(0, len(words), chunk_size):
-        chunk = " ".join(words[i:i + chunk_size])
-        if chunk.strip() and len(chunk.split()) > 20:
-            chunks.append(chunk)
+        # The slice length is the chunk's word count, no need to re-split
+        if min(chunk_size, len(words) - i) > 20:
+            chunks.append(" ".join(words[i:i + chunk_size]))
     return chunks
 
 class BatchProcessor:
@@ -48,8 +254,22 @@ class BatchProcessor:
         self.documents = []
         self.metadatas = []
         self.total_processed = 0
+        self.total_encoded = 0
+        self.total_unchanged = 0
 
     def add(self, doc_id, document, metadata):
+        # Pre-truncated excerpts and the config-path flag let the MCP server
+        # answer find_config_location / compare_omarchy_vs_arch from metadata
+        # alone, without pulling full documents back from Chroma.
+        metadata = {
+            **metadata,
+            "excerpt_300": document[:300],
+            "excerpt_500": document[:500],
+            "has_config_path": CONFIG_PATH_RE.search(document) is not None,
+            # Part of the unchanged-chunk check in drop_unchanged(), so chunks
+            # are re-embedded after switching device, precision or ONNX
+            "embedding_backend": embedding_cache.model_key
+        }
         self.ids.append(doc_id)
         self.documents.append(document)
         self.metadatas.append(metadata)
@@ -60,44 +280,158 @@ class BatchProcessor:
     def flush(self):
         if not self.documents:
             return
-            
-        # 1. Generate embeddings for the whole batch (Vectorized operation = FAST)
-        embeddings = embedder.encode(self.documents).tolist()
         
-        # 2. Upsert to Chroma in one network request
-        collection.upsert(
-            ids=self.ids,
-            documents=self.documents,
-            embeddings=embeddings,
-            metadatas=self.metadatas
-        )
+        ids, documents, metadatas = self.drop_unchanged()
+        if ids:
+            # 1. Generate embeddings for the whole batch (Vectorized operation = FAST).
+            # Only text not seen before, in this batch or an earlier run, goes
+            # through the model; release notes repeat whole blocks verbatim.
+            hashes = [EmbeddingCache.key(doc) for doc in documents]
+            vectors = embedding_cache.get_many(hashes)
+            pending = {}
+            for h, doc in zip(hashes, documents):
+                if h not in vectors:
+                    pending.setdefault(h, doc)
+            if pending:
+                new_vectors = dict(zip(pending, encode_documents(list(pending.values()))))
+                embedding_cache.put_many(new_vectors)
+                vectors.update(new_vectors)
+            embeddings = np.stack([vectors[h] for h in hashes])
+            self.total_encoded += len(pending)
+            
+            # 2. Upsert to Chroma in one request. Both clients take the numpy
+            # array directly, no Python list of floats needed.
+            self.upsert(ids, documents, embeddings, metadatas)
         
-        self.total_processed += len(self.documents)
+        # Only count and clear the batch once it's stored; if anything above
+        # raised, the buffer is kept and retried on the next flush
+        self.total_processed += len(self.ids)
+        self.total_unchanged += len(self.ids) - len(ids)
         # Clear buffers
         self.ids = []
         self.documents = []
         self.metadatas = []
 
+    def drop_unchanged(self):
+        """Return the buffered (ids, documents, metadatas) minus chunks Chroma
+        already stores with the same document and metadata, so re-runs only
+        embed and upsert what's new, edited or embedded by another backend."""
+        stored = collection.get(ids=self.ids, include=["documents", "metadatas"])
+        existing = {
+            doc_id: (document, metadata)
+            for doc_id, document, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        keep = [
+            i for i, doc_id in enumerate(self.ids)
+            if existing.get(doc_id) != (self.documents[i], self.metadatas[i])
+        ]
+        return (
+            [self.ids[i] for i in keep],
+            [self.documents[i] for i in keep],
+            [self.metadatas[i] for i in keep]
+        )
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        """Upsert one batch, splitting it in half if Chroma rejects it (413/timeout)."""
+        try:
+            collection.upsert(
+                ids=ids,
+                documents=documents,
+                embeddings=embeddings,
+                metadatas=metadatas
+            )
+        except Exception as e:
+            # Anything else (connection refused, auth, duplicate ids, bad
+            # metadata) fails the same way at any size, so don't bisect it
+            if len(ids) == 1 or not is_splittable_upsert_error(e):
+                raise
+            half = len(ids) // 2
+            tqdm.write(f"  ⚠️  Upsert of {len(ids)} chunks failed ({e}), retrying in halves")
+            self.upsert(ids[:half], documents[:half], embeddings[:half], metadatas[:half])
+            self.upsert(ids[half:], documents[half:], embeddings[half:], metadatas[half:])
+            return
+        
+        # Rough request size, for tuning BATCH_SIZE
+        payload_kb = (embeddings.nbytes + sum(len(doc) for doc in documents)) // 1024
+        tqdm.write(f"  📤 Upserted {len(ids)} chunks (~{payload_kb} KB)")
+
+# Response text of a 413 from Chroma or a reverse proxy in front of it, and
+# the chromadb client's own max-batch-size check
+PAYLOAD_TOO_LARGE_MARKERS = (
+    "Request Entity Too Large",
+    "Payload Too Large",
+    "Content Too Large",
+    "embeddings at once"
+)
+
+def is_splittable_upsert_error(e):
+    """True if a smaller upsert could succeed: the payload was too large or timed out."""
+    if isinstance(e, (httpx.TimeoutException, requests.exceptions.Timeout, TimeoutError)):
+        return True
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code == 413
+    # chromadb's HTTP client re-raises non-Chroma error responses as a bare
+    # Exception carrying only the response body, so match on its text
+    return any(marker in str(e) for marker in PAYLOAD_TOO_LARGE_MARKERS)
+
 # Global batch processor
 processor = BatchProcessor()
 
+def load_json(json_file):
+    """Read and parse one JSON file; report and return None if it's broken."""
+    try:
+        return orjson.loads(json_file.read_bytes())
+    except Exception as e:
+        print(f"Error in {json_file}: {e}")
+        return None
+
+def iter_json_files(json_files):
+    """Yield (path, data), parsing upcoming files on threads while the caller encodes."""
+    # At most READ_AHEAD files are parsed ahead of the consumer, so a large
+    # directory isn't loaded into memory all at once
+    files = iter(json_files)
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        window = deque(
+            (json_file, executor.submit(load_json, json_file))
+            for json_file in itertools.islice(files, READ_AHEAD)
+        )
+        while window:
+            json_file, future = window.popleft()
+            for next_file in itertools.islice(files, 1):
+                window.append((next_file, executor.submit(load_json, next_file)))
+            data = future.result()
+            if data is not None:
+                yield json_file, data
+
+def iter_pages(source_dir):
+    """Yield (name, page dict) from per-page *.json files and *.jsonl exports."""
+    for json_file, data in iter_json_files(list(source_dir.glob("*.json"))):
+        yield json_file.stem, data
+    
+    # One page per line, as written by the Arch/Hyprland cleaners
+    for jsonl_file in source_dir.glob("*.jsonl"):
+        with open(jsonl_file, 'rb') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield f"{jsonl_file.stem}_{line_no}", orjson.loads(line)
+                except Exception as e:
+                    print(f"Error in {jsonl_file}:{line_no}: {e}")
+
 def ingest_source(source_name, source_dir):
     """Read files and add to batch processor."""
     print(f"\n📥 Queuing {source_name} documentation...")
     
-    json_files = list(source_dir.glob("*.json"))
-    if not json_files:
+    if not any(source_dir.glob("*.json")) and not any(source_dir.glob("*.jsonl")):
         print(f"  ⚠️  No JSON files found in {source_dir}")
         return
     
     # Just iterate and add to batch
-    for json_file in tqdm(json_files, desc=f"  Reading {source_name}"):
+    for name, data in tqdm(iter_pages(source_dir), desc=f"  Reading {source_name}"):
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
             source = data.get("source", "unknown")
-            page = data.get("page", json_file.stem)
+            page = data.get("page", name)
             version = data.get("version", "any")
             priority = data.get("priority", 3)
             
@@ -120,12 +454,16 @@ def ingest_source(source_name, source_dir):
             
             # Chunk and add
             for section_idx, (section, content, tags) in enumerate(contents_to_process):
-                if not content or len(content.split()) < 20:
+                # Split once; the word list drives both the guard and chunking
+                words = content.split() if content else []
+                if len(words) < 20:
                     continue
                     
-                chunks = chunk_text(content)
+                chunks = chunk_words(words)
+                # Only the chunk index varies per chunk, and it needs no translating
+                id_prefix = f"{source}_{page}_{section_idx}_{section}".translate(ID_TRANS)
                 for i, chunk in enumerate(chunks):
-                    doc_id = f"{source}_{page}_{section_idx}_{section}_{i}".replace(" ", "_").replace("/", "_")[:100]
+                    doc_id = f"{id_prefix}_{i}"[:100]
                     
                     # ADD TO BATCH INSTEAD OF PROCESSING IMMEDIATELY
                     processor.add(
@@ -143,7 +481,7 @@ def ingest_source(source_name, source_dir):
                     )
                     
         except Exception as e:
-            print(f"Error in {json_file}: {e}")
+            print(f"Error in {name}: {e}")
 
 def process_releases():
     """Process release notes (already fast, but adding to batch consistency)."""
@@ -153,10 +491,8 @@ def process_releases():
         return
 
     json_files = list(releases_dir.glob("*.json"))
-    for json_file in json_files:
+    for json_file, chunks in iter_json_files(json_files):
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                chunks = json.load(f)
             for chunk in chunks:
                  # Check validity
                 if not all(k in chunk for k in ["content", "version", "section_id"]): continue
@@ -181,25 +517,34 @@ def main():
     print("OMARCHY MCP - OPTIMIZED BATCH INGESTION")
     print("=" * 60)
     
-    # 1. Queue everything
-    if (PROCESSED_DIR / "archwiki").exists():
-        ingest_source("ArchWiki", PROCESSED_DIR / "archwiki")
+    init_pipeline()
     
-    if (PROCESSED_DIR / "hyprland").exists():
-        ingest_source("Hyprland", PROCESSED_DIR / "hyprland")
+    try:
+        # 1. Queue everything
+        if (PROCESSED_DIR / "archwiki").exists():
+            ingest_source("ArchWiki", PROCESSED_DIR / "archwiki")
         
-    process_releases()
-    
-    if (PROCESSED_DIR / "omarchy").exists():
-        ingest_source("Omarchy", PROCESSED_DIR / "omarchy")
-    
-    # 2. Final Flush (Process whatever is left in the buffer)
-    print("\n🔄 Processing final batch...")
-    processor.flush()
+        if (PROCESSED_DIR / "hyprland").exists():
+            ingest_source("Hyprland", PROCESSED_DIR / "hyprland")
+            
+        process_releases()
+        
+        if (PROCESSED_DIR / "omarchy").exists():
+            ingest_source("Omarchy", PROCESSED_DIR / "omarchy")
+        
+        # 2. Final Flush (Process whatever is left in the buffer)
+        print("\n🔄 Processing final batch...")
+        processor.flush()
+    finally:
+        if pool is not None:
+            embedder.stop_multi_process_pool(pool)
+        embedding_cache.close()
     
     print("\n" + "=" * 60)
     print(f"✅ INGESTION COMPLETE")
     print(f"📊 Total chunks vectorized: {processor.total_processed}")
+    print(f"⏭️  Already up to date in Chroma: {processor.total_unchanged}")
+    print(f"🧠 Embedded by the model: {processor.total_encoded} (rest from {EMBEDDING_CACHE_FILE})")
     print("=" * 60)
 
 if __name__ == "__main__":
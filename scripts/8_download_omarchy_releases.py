@@ -4,6 +4,20 @@ import requests
 import json
 import os
 from packaging import version
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+def make_session():
+    """GitHub API session: one keep-alive connection, retries with backoff."""
+    session = requests.Session()
+    retry = Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504])
+    session.mount("https://", HTTPAdapter(max_retries=retry))
+    session.headers["Accept"] = "application/vnd.github+json"
+    # Authenticated requests get 5000 requests/hour instead of 60
+    token = os.getenv("GITHUB_TOKEN")
+    if token:
+        session.headers["Authorization"] = f"Bearer {token}"
+    return session
 
 def download_releases(max_version="3.8.0"):
     """Download all release notes up to max_version"""
@@ -11,12 +25,20 @@ def download_releases(max_version="3.8.0"):
     output_dir = "/app/data/raw/omarchy_releases"
     os.makedirs(output_dir, exist_ok=True)
     
-    # Fetch all releases from GitHub API
+    # Fetch all releases from GitHub API, following the Link header past
+    # the 100-per-page limit
     url = "https://api.github.com/repos/basecamp/omarchy/releases"
+    params = {"per_page": 100}
+    releases = []
     try:
-        response = requests.get(url, params={"per_page": 100}, timeout=10)
-        response.raise_for_status()
-        releases = response.json()
+        with make_session() as session:
+            while url:
+                response = session.get(url, params=params, timeout=10)
+                response.raise_for_status()
+                releases.extend(response.json())
+                # The next-page URL already carries the query string
+                url = response.links.get("next", {}).get("url")
+                params = None
     except requests.exceptions.RequestException as e:
         print(f"❌ Error fetching releases: {e}")
         return 0
@@ -1,9 +1,26 @@
 #!/usr/bin/env python3
 """Convert release notes to searchable JSON chunks"""
-import json
 import re
 import glob
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import ijson
+import orjson
+
+# A "## " header line; split() on it yields [preamble, title1, body1, ...]
+HEADER_RE = re.compile(r"^## (.*)$", re.MULTILINE)
+WRITE_WORKERS = 8
+
+def write_chunks(item):
+    """Write one release's chunks; report and return False if it fails."""
+    output_file, chunks = item
+    try:
+        # Indented like the committed snapshots, which are diffed on upgrade
+        output_file.write_bytes(orjson.dumps(chunks, option=orjson.OPT_INDENT_2))
+        return True
+    except Exception as e:
+        print(f"  ⚠️  Error writing {output_file}: {e}")
+        return False
 
 def clean_release_notes():
     # Find ANY release file instead of hardcoding the name
@@ -21,11 +38,19 @@ def clean_release_notes():
     output_dir = "/app/data/processed/omarchy_releases"
     Path(output_dir).mkdir(parents=True, exist_ok=True)
     
-    with open(input_file) as f:
-        releases = json.load(f)
-    
-    processed_count = 0
+    # Stream one release at a time instead of loading the whole file, and
+    # write each release's chunks on a thread pool as soon as it's cleaned
+    with open(input_file, "rb") as f, ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+        writes = [
+            executor.submit(write_chunks, item)
+            for item in iter_release_chunks(ijson.items(f, "item", use_float=True), output_dir)
+        ]
+    processed_count = sum(write.result() for write in writes)
     
+    print(f"🎉 Total releases processed: {processed_count}")
+
+def iter_release_chunks(releases, output_dir):
+    """Yield (output_file, chunks) for each release with usable notes."""
     for release in releases:
         try:
             version = release.get("version", "unknown")
@@ -60,36 +85,28 @@ def clean_release_notes():
             if not chunks:
                 continue
             
-            # Save processed chunks
-            output_file = f"{output_dir}/{version}.json"
-            with open(output_file, "w") as f:
-                json.dump(chunks, f, indent=2)
-            
             print(f"✅ Processed v{version}: {len(chunks)} chunks")
-            processed_count += 1
+            yield Path(output_dir) / f"{version}.json", chunks
         
         except Exception as e:
             version = release.get("version", "unknown")
             print(f"  ⚠️  Error processing release {version}: {e}")
             continue
 
-    print(f"🎉 Total releases processed: {processed_count}")
-
 def split_into_sections(markdown):
     """Split markdown by ## headers"""
+    parts = HEADER_RE.split(markdown)
     sections = []
-    current = {"title": "Overview", "content": ""}
     
-    for line in markdown.split("\n"):
-        if line.startswith("## "):
-            if current["content"]:
-                sections.append(current)
-            current = {"title": line[3:].strip(), "content": ""}
-        else:
-            current["content"] += line + "\n"
+    if parts[0]:
+        sections.append({"title": "Overview", "content": parts[0]})
     
-    if current["content"]:
-        sections.append(current)
+    for i in range(1, len(parts), 2):
+        # Each body starts with the newline that ended its header line;
+        # a header directly followed by another header has no content
+        content = parts[i + 1][1:]
+        if content:
+            sections.append({"title": parts[i].strip(), "content": content})
     
     return sections
 
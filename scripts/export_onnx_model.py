@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Export the embedding model to ONNX and quantize it to INT8.
+Run once, then set ONNX_MODEL_DIR to the output directory to use it.
+"""
+
+from pathlib import Path
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from optimum.onnxruntime import ORTModelForFeatureExtraction
+from transformers import AutoTokenizer
+
+HF_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+OUTPUT_DIR = Path("data/models/all-MiniLM-L6-v2-onnx")
+
+def main():
+    print(f"📦 Exporting {HF_MODEL} to ONNX...")
+    model = ORTModelForFeatureExtraction.from_pretrained(HF_MODEL, export=True)
+    model.save_pretrained(OUTPUT_DIR)
+    AutoTokenizer.from_pretrained(HF_MODEL).save_pretrained(OUTPUT_DIR)
+
+    # Dynamic quantization: INT8 weights, activations quantized at runtime
+    print("🔧 Quantizing weights to INT8...")
+    quantize_dynamic(
+        OUTPUT_DIR / "model.onnx",
+        OUTPUT_DIR / "model_int8.onnx",
+        weight_type=QuantType.QInt8
+    )
+
+    print(f"✅ Quantized model saved → {OUTPUT_DIR / 'model_int8.onnx'}")
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ Simple MCP client tester - validates the server works.
 import json
 import sys
 import os
+import asyncio
 
 # Add project root to Python path so we can import mcp_server
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -17,13 +18,13 @@ from mcp_server.main import (
     get_server_info
 )
 
-def test_server_info():
+async def test_server_info():
     """Test 1: Get server info"""
     print("\n" + "="*60)
     print("TEST 1: Server Info")
     print("="*60)
     
-    result = get_server_info()
+    result = await get_server_info()
     data = json.loads(result)
     
     print(f"✅ Server: {data['name']}")
@@ -33,7 +34,7 @@ def test_server_info():
         print(f"   - {source}: {info['count']} docs (priority {info['priority']})")
     print(f"✅ Model: {data['embedding_model']}")
 
-def test_search_documentation():
+async def test_search_documentation():
     """Test 2: Search documentation"""
     print("\n" + "="*60)
     print("TEST 2: Search Documentation")
@@ -47,7 +48,7 @@ def test_search_documentation():
     
     for query in queries:
         print(f"\n🔍 Query: {query}")
-        result = search_documentation(query=query, top_k=3)
+        result = await search_documentation(query=query, top_k=3)
         data = json.loads(result)
         
         if data:
@@ -59,7 +60,7 @@ def test_search_documentation():
         else:
             print("   ⚠️ No results")
 
-def test_find_config():
+async def test_find_config():
     """Test 3: Find config location"""
     print("\n" + "="*60)
     print("TEST 3: Find Config Location")
@@ -69,7 +70,7 @@ def test_find_config():
     
     for app in apps:
         print(f"\n📁 App: {app}")
-        result = find_config_location(app_name=app, source="omarchy")
+        result = await find_config_location(app_name=app, source="omarchy")
         data = json.loads(result)
         
         if isinstance(data, list) and data:
@@ -79,7 +80,7 @@ def test_find_config():
         elif "error" in data:
             print(f"   ⚠️ {data['error']}")
 
-def test_comparison():
+async def test_comparison():
     """Test 4: Compare Omarchy vs Arch"""
     print("\n" + "="*60)
     print("TEST 4: Compare Omarchy vs Arch")
@@ -88,7 +89,7 @@ def test_comparison():
     topic = "waybar configuration"
     print(f"\n⚖️  Topic: {topic}")
     
-    result = compare_omarchy_vs_arch(topic=topic)
+    result = await compare_omarchy_vs_arch(topic=topic)
     data = json.loads(result)
     
     print(f"\n   Omarchy approach: {len(data['omarchy_approach'])} docs")
@@ -100,16 +101,21 @@ def test_comparison():
     for doc in data['arch_hyprland_approach'][:1]:
         print(f"   - [{doc['source']}] {doc['page']}")
 
+async def run_tests():
+    # The tools are async and share one embedding queue, so run them all
+    # inside a single event loop.
+    await test_server_info()
+    await test_search_documentation()
+    await test_find_config()
+    await test_comparison()
+
 def main():
     print("\n" + "🧪 " + "="*58)
     print("   OMARCHY MCP SERVER - FUNCTIONALITY TEST")
     print("=" + "="*58)
     
     try:
-        test_server_info()
-        test_search_documentation()
-        test_find_config()
-        test_comparison()
+        asyncio.run(run_tests())
         
         print("\n" + "="*60)
         print("✅ ALL TESTS PASSED - MCP SERVER IS WORKING!")